@@ -0,0 +1,96 @@
+"""
+Benchmark for the non-hardlink scanner in hardlink-radarr.py.
+
+Builds a synthetic movie library in a temporary directory and compares the
+os.walk based walker the script used to ship with against the scandir scanner.
+
+Usage: python3 benchmarks/hardlink_scan.py [--movies 5000] [--workers 8]
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "hardlink-radarr.py")
+
+
+def load_script():
+    # The scripts import radarr_common.py from their own folder
+    sys.path.insert(0, os.path.dirname(SCRIPT_PATH))
+    spec = importlib.util.spec_from_file_location("hardlink_radarr", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def walk_non_hardlinked_files(dir_path):
+    # The original walker, with the extension check fixed so both find the same files
+    non_hardlinked_files = []
+
+    for root, dirs, files in os.walk(dir_path):
+        for file in files:
+            if file.endswith((".mkv", ".mp4")):
+                file_path = os.path.join(root, file)
+                if os.path.isfile(file_path) and os.stat(file_path).st_nlink == 1:
+                    non_hardlinked_files.append(file_path)
+
+    return non_hardlinked_files
+
+
+def build_library(root, movies):
+    links = os.path.join(root, "torrents")
+    library = os.path.join(root, "movies")
+    os.makedirs(links)
+    os.makedirs(library)
+
+    for index in range(movies):
+        folder = os.path.join(library, f"Movie {index} (2000)")
+        os.makedirs(folder)
+        extension = ".mkv" if index % 3 else ".mp4"
+        movie_file = os.path.join(folder, f"Movie.{index}.2000.1080p{extension}")
+        open(movie_file, "w").close()
+        open(os.path.join(folder, "movie.nfo"), "w").close()
+        if index % 2:
+            os.link(movie_file, os.path.join(links, f"{index}{extension}"))
+
+    return library
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hardlink scanners")
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    script = load_script()
+
+    with tempfile.TemporaryDirectory() as root:
+        library = build_library(root, args.movies)
+
+        walked, walk_time = timed(walk_non_hardlinked_files, library)
+        scanned, scan_time = timed(
+            script.get_non_hardlinked_files,
+            library,
+            script.VIDEO_EXTENSIONS,
+            args.workers,
+        )
+
+    assert sorted(walked) == sorted(scanned), "scanners disagree"
+
+    print(f"Movies: {args.movies}, non-hardlinked: {len(scanned)}")
+    print(f"os.walk walker:  {walk_time:.3f}s")
+    print(f"scandir scanner: {scan_time:.3f}s ({args.workers} workers)")
+    print(f"Speedup: {walk_time / scan_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark for calculate_average_ratios in qbit-avg-ratio.py.
+
+Aggregates a synthetic torrent list with the totals-only loop the script used
+to ship with, and with the current aggregation (totals, median, quantile
+sketch and histogram of every category and tag), once with NumPy and once
+with the pure Python fallback.
+
+Usage: python3 benchmarks/qbit_avg_ratio.py [--torrents 150000] [--repeat 3]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import time
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "qbit-avg-ratio.py")
+
+CATEGORIES = ["movies", "tv", "music", "books", "games", "software", "anime", ""]
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("qbit_avg_ratio", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Torrent(dict):
+    # qbittorrent-api torrents can be read as attributes too, the old loop did that
+    __getattr__ = dict.__getitem__
+
+
+def build_torrents(count):
+    rng = random.Random(0)
+    tags = [f"tag{index}" for index in range(40)] + ["noHL", "cross-seed"]
+    torrents = []
+    for index in range(count):
+        ratio = 0.0 if rng.random() < 0.1 else rng.lognormvariate(0, 1.5)
+        torrent_tags = rng.sample(tags, rng.choice([0, 1, 1, 2, 2, 3]))
+        torrents.append(
+            Torrent(
+                hash=f"{index:040x}",
+                ratio=round(ratio, 3),
+                size=rng.randint(1 << 20, 1 << 36),
+                category=rng.choice(CATEGORIES),
+                tags=", ".join(torrent_tags),
+            )
+        )
+    return torrents
+
+
+def calculate_average_ratios_baseline(torrents):
+    category_ratios = {}
+    tag_ratios = {}
+
+    for torrent in torrents:
+        category = torrent.category
+        if category not in category_ratios:
+            category_ratios[category] = {"total_ratio": 0, "count": 0, "total_size": 0}
+
+        category_ratios[category]["total_ratio"] += torrent.ratio
+        category_ratios[category]["count"] += 1
+        category_ratios[category]["total_size"] += torrent.size
+
+        tags = [tag.strip() for tag in torrent.tags.split(",")] if torrent.tags else []
+        for tag in tags:
+            if tag not in tag_ratios:
+                tag_ratios[tag] = {"total_ratio": 0, "count": 0, "total_size": 0}
+
+            tag_ratios[tag]["total_ratio"] += torrent.ratio
+            tag_ratios[tag]["count"] += 1
+            tag_ratios[tag]["total_size"] += torrent.size
+
+    sorted_categories = sorted(
+        category_ratios.items(),
+        key=lambda x: x[1]["total_ratio"] / x[1]["count"],
+        reverse=True,
+    )
+    sorted_tags = sorted(
+        tag_ratios.items(),
+        key=lambda x: x[1]["total_ratio"] / x[1]["count"],
+        reverse=True,
+    )
+
+    return sorted_categories, sorted_tags
+
+
+def best_of(repeat, function):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark calculate_average_ratios")
+    parser.add_argument("--torrents", type=int, default=150000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    script = load_script()
+    torrents = build_torrents(args.torrents)
+    numpy = script.np
+
+    baseline, baseline_time = best_of(
+        args.repeat, lambda: calculate_average_ratios_baseline(torrents)
+    )
+    timings = []
+
+    results = {}
+    engines = [("NumPy", numpy), ("pure Python", None)] if numpy else []
+    for label, module in engines or [("pure Python", None)]:
+        script.np = module
+        results[label], new_time = best_of(
+            args.repeat, lambda: script.calculate_average_ratios(torrents)
+        )
+        timings.append((f"new, {label}", new_time))
+    script.np = numpy
+
+    # Both engines and the old loop must agree on the totals of every group
+    for sorted_categories, sorted_tags in results.values():
+        for old, new in zip(baseline, (sorted_categories, sorted_tags)):
+            assert len(old) == len(new)
+            old_counts = {name: stats["count"] for name, stats in old}
+            assert old_counts == {name: stats["count"] for name, stats in new}
+    if len(results) == 2:
+        python_tags = dict(results["pure Python"][1])
+        for name, stats in results["NumPy"][1]:
+            assert stats["p50"] == python_tags[name]["p50"], name
+            assert stats["histogram"] == python_tags[name]["histogram"], name
+
+    print(f"Torrents: {args.torrents}")
+    print(f"{'old loop (totals only):':<24}{baseline_time:.3f}s")
+    for label, seconds in timings:
+        print(f"{label + ':':<24}{seconds:.3f}s  ({baseline_time / seconds:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
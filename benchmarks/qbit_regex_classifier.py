@@ -0,0 +1,104 @@
+"""
+Micro-benchmark for the torrent name classifier in qbit_regex.py.
+
+Compares the re.match calls the script used to make per torrent (up to four
+with --all) against the single-scan classify() on synthetic release names,
+and checks that both give the same classes for every name.
+
+Usage: python3 benchmarks/qbit_regex_classifier.py [--names 200000]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import re
+import time
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "qbit_regex.py")
+
+WORDS = [
+    "The", "Show", "Name", "Of", "Night", "House", "Star", "Dragon", "Office",
+    "Sopranos", "Expanse", "Wire", "Lost", "Severance", "Andor", "Stranger",
+]
+TAGS = [
+    "1080p", "2160p", "720p", "WEB-DL", "BluRay", "REMUX", "DDP5.1", "Atmos",
+    "H.264", "x265", "HDR", "DV", "AMZN", "NF", "REPACK", "PROPER", "iNTERNAL",
+]
+GROUPS = ["NTb", "FLUX", "CAKES", "EDITH", "SiGMA", "playWEB", "BLOOM"]
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("qbit_regex", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_name(rng):
+    title = ".".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+    season = rng.randint(1, 30)
+    episode = rng.randint(1, 24)
+    marker = rng.choice(
+        [
+            f"S{season:02d}",  # season pack
+            f"S{season:02d}E{episode:02d}",  # episode
+            f"s{season}e{episode}",  # lowercase episode
+            f"S{season:02d}E{episode:02d}E{episode + 1:02d}",  # multi-episode, matches neither
+            f"S{season:02d}.Part.1.S{season:02d}E{episode:02d}",  # both
+            str(rng.randint(1950, 2025)),  # movie or daily show
+            f"Season.{season}",  # spelled out, unmatched
+            f"S{season:02d}x{episode:02d}",  # unmatched
+        ]
+    )
+    tags = ".".join(rng.sample(TAGS, rng.randint(2, 8)))
+    return f"{title}.{marker}.{tags}-{rng.choice(GROUPS)}"
+
+
+def classify_with_re_match(script, name):
+    # What the main loop used to do for a torrent with --all
+    season = bool(re.match(script.SEASONS_REGEX_PATTERN, name))
+    episode = bool(re.match(script.EPISODES_REGEX_PATTERN, name))
+    unmatched = not (
+        re.match(script.SEASONS_REGEX_PATTERN, name)
+        or re.match(script.EPISODES_REGEX_PATTERN, name)
+    )
+    return season, episode, unmatched
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the name classifier")
+    parser.add_argument("--names", type=int, default=200000)
+    args = parser.parse_args()
+
+    script = load_script()
+    rng = random.Random(0)
+    names = [build_name(rng) for _ in range(args.names)]
+
+    old, old_time = timed(
+        lambda: [classify_with_re_match(script, name) for name in names]
+    )
+    new, new_time = timed(lambda: [script.classify(name) for name in names])
+
+    for name, expected, classes in zip(names, old, new):
+        actual = (
+            script.SEASON in classes,
+            script.EPISODE in classes,
+            script.UNMATCHED in classes,
+        )
+        assert actual == expected, f"classifiers disagree on {name!r}"
+
+    print(f"Names: {args.names}")
+    print(f"re.match per pattern:  {old_time * 1000:.1f} ms")
+    print(f"classify():            {new_time * 1000:.1f} ms")
+    print(f"Speedup:               {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark for the rules file classifier in qbit_regex.py.
+
+Classifies synthetic release names with growing rule sets, once with the
+combined RuleSet regex and once with one search per rule (what adding
+another re.match pass per class amounts to). Also checks RuleSet against a
+straightforward implementation of its first-match-wins semantics.
+
+The extra rules come in three shapes, because the combined regex only checks
+a shared literal prefix once and rules without one are searched on their own:
+  shared    all extra rules start with the same word (\bPART0\.\d+, \bPART1\.\d+, ...)
+  distinct  every extra rule starts with its own word (\bKOVAL\d+, \bMIRTH\d+, ...)
+  group     the word is inside a group, so there is no literal prefix (\b(?:KOVAL)\d+)
+
+Usage: python3 benchmarks/qbit_regex_rules.py [--names 100000] [--rules 4 10 25 50 100]
+                                              [--shapes shared distinct group]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import re
+import string
+import time
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "qbit_regex.py")
+
+BASE_RULES = [
+    (r"\bS\d+-S\d+\b", "noHL complete"),
+    (r"\bS00E\d+\b", "noHL specials"),
+    (r"\bS\d+E\d+\b", "noHL episodes"),
+    (r"\bS\d+\b", "noHL seasons"),
+]
+WORDS = ["The", "Show", "Name", "Night", "House", "Star", "Dragon", "Office", "Wire"]
+TAGS = ["1080p", "2160p", "720p", "WEB-DL", "BluRay", "REMUX", "DDP5.1", "x265", "HDR"]
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("qbit_regex", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_keywords(count):
+    # Random words, so the extra rules share no more than their first letters by chance
+    rng = random.Random(0)
+    keywords = set()
+    while len(keywords) < count:
+        keywords.add("".join(rng.choice(string.ascii_uppercase) for _ in range(5)))
+    return sorted(keywords)
+
+
+def build_rules(count, shape, keywords):
+    # Extra rules look like real ones (a keyword plus a number) and rarely match
+    rules = list(BASE_RULES)
+    for index in range(count - len(rules)):
+        if shape == "shared":
+            pattern = rf"\bPART{index}\.\d+\b"
+        elif shape == "distinct":
+            pattern = rf"\b{keywords[index]}\d+\b"
+        else:
+            pattern = rf"\b(?:{keywords[index]})\d+\b"
+        rules.append((pattern, f"noHL extra {index}"))
+    return rules[:count]
+
+
+def build_name(rng, rule_count, shape, keywords):
+    title = ".".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+    season = rng.randint(0, 20)
+    extra = rng.randrange(max(1, rule_count - len(BASE_RULES)))
+    keyword = f"PART{extra}." if shape == "shared" else keywords[extra]
+    marker = rng.choice(
+        [
+            f"S{season:02d}",
+            f"S{season:02d}E{rng.randint(1, 24):02d}",
+            f"S01-S{season + 1:02d}",
+            f"{keyword}{season}",
+            str(rng.randint(1950, 2025)),
+        ]
+    )
+    tags = ".".join(rng.sample(TAGS, rng.randint(2, 6)))
+    return f"{title}.{marker}.{tags}-GROUP"
+
+
+def classify_per_rule(compiled_rules, name):
+    # One pass per rule, the first rule in the list that matches anywhere wins
+    for regex, tag in compiled_rules:
+        if regex.search(name):
+            return tag
+    return None
+
+
+def classify_reference(compiled_rules, name):
+    # RuleSet's semantics spelled out: earliest match in the name, then rule order
+    best = None
+    for index, (regex, tag) in enumerate(compiled_rules):
+        match = regex.search(name)
+        if match and (best is None or (match.start(), index) < best[0]):
+            best = ((match.start(), index), tag)
+    return best[1] if best else None
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rules classifier")
+    parser.add_argument("--names", type=int, default=100000)
+    parser.add_argument("--rules", type=int, nargs="+", default=[4, 10, 25, 50, 100])
+    parser.add_argument(
+        "--shapes",
+        nargs="+",
+        choices=["shared", "distinct", "group"],
+        default=["shared", "distinct", "group"],
+    )
+    args = parser.parse_args()
+
+    script = load_script()
+    keywords = build_keywords(max(args.rules))
+    print(f"Names: {args.names}")
+    print(
+        f"{'shape':>9} {'rules':>6} {'RuleSet ns/name':>16} "
+        f"{'per rule ns/name':>17} {'speedup':>8}"
+    )
+
+    for shape, rule_count in (
+        (shape, rule_count) for shape in args.shapes for rule_count in args.rules
+    ):
+        rng = random.Random(rule_count)
+        names = [
+            build_name(rng, rule_count, shape, keywords) for _ in range(args.names)
+        ]
+        rules = build_rules(rule_count, shape, keywords)
+        rule_set = script.RuleSet(rules, unmatched_tag=None)
+        compiled_rules = [(re.compile(pattern, re.IGNORECASE), tag) for pattern, tag in rules]
+
+        combined, combined_time = timed(lambda: [rule_set.classify(name) for name in names])
+        _, per_rule_time = timed(
+            lambda: [classify_per_rule(compiled_rules, name) for name in names]
+        )
+
+        for name, classes in zip(names, combined):
+            expected = classify_reference(compiled_rules, name)
+            actual = None if classes == script.UNMATCHED_ONLY else next(iter(classes))
+            assert actual == expected, f"RuleSet disagrees on {name!r}"
+
+        print(
+            f"{shape:>9} {rule_count:>6} {combined_time / args.names * 1e9:>16.0f} "
+            f"{per_rule_time / args.names * 1e9:>17.0f} "
+            f"{per_rule_time / combined_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark for parsing the Radarr /api/v3/movie response in not-cutoff-radarr.py.
+
+Generates a synthetic library with the fields Radarr returns (images, alternate
+titles, ratings, ...) and compares response.json() on the whole payload with the
+streaming parser that only keeps the fields the script needs.
+
+Usage: python3 benchmarks/radarr_movie_parsing.py [--movies 40000]
+"""
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "not-cutoff-radarr.py")
+
+
+def load_script():
+    # The scripts import radarr_common.py from their own folder
+    sys.path.insert(0, os.path.dirname(SCRIPT_PATH))
+    spec = importlib.util.spec_from_file_location("not_cutoff_radarr", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeResponse:
+    def __init__(self, payload, chunk_size=1 << 16):
+        self.payload = payload
+        self.chunk_size = chunk_size
+
+    def iter_content(self, chunk_size=1 << 16):
+        for i in range(0, len(self.payload), chunk_size):
+            yield self.payload[i : i + chunk_size]
+
+    def json(self):
+        # requests joins the whole body before decoding it
+        content = b"".join(self.iter_content(self.chunk_size))
+        return json.loads(content)
+
+
+def build_movie(index):
+    return {
+        "id": index,
+        "title": f"Movie {index}",
+        "originalTitle": f"Movie {index}",
+        "alternateTitles": [
+            {"sourceType": "tmdb", "movieMetadataId": index, "title": f"Alt {index} {n}"}
+            for n in range(5)
+        ],
+        "sortTitle": f"movie {index}",
+        "sizeOnDisk": 10_000_000_000 + index,
+        "status": "released",
+        "overview": "A synthetic movie overview. " * 12,
+        "inCinemas": "2020-01-01T00:00:00Z",
+        "physicalRelease": "2020-04-01T00:00:00Z",
+        "digitalRelease": "2020-03-01T00:00:00Z",
+        "images": [
+            {
+                "coverType": cover,
+                "url": f"/MediaCover/{index}/{cover}.jpg",
+                "remoteUrl": f"https://image.tmdb.org/t/p/original/{index}{cover}.jpg",
+            }
+            for cover in ("poster", "fanart")
+        ],
+        "website": "",
+        "year": 2020,
+        "hasFile": True,
+        "youTubeTrailerId": "abcdefghijk",
+        "studio": "Studio",
+        "path": f"/movies/Movie {index} (2020)",
+        "qualityProfileId": 1,
+        "monitored": bool(index % 2),
+        "minimumAvailability": "released",
+        "isAvailable": True,
+        "folderName": f"/movies/Movie {index} (2020)",
+        "runtime": 120,
+        "cleanTitle": f"movie{index}",
+        "imdbId": f"tt{index:07d}",
+        "tmdbId": index,
+        "titleSlug": str(index),
+        "genres": ["Action", "Drama", "Thriller"],
+        "tags": [],
+        "added": "2021-01-01T00:00:00Z",
+        "ratings": {
+            source: {"votes": 1000, "value": 7.1, "type": "user"}
+            for source in ("imdb", "tmdb", "metacritic", "rottenTomatoes")
+        },
+        "movieFile": {
+            "movieId": index,
+            "relativePath": f"Movie.{index}.2020.1080p.BluRay.x264.mkv",
+            "path": f"/movies/Movie {index} (2020)/Movie.{index}.2020.1080p.BluRay.x264.mkv",
+            "size": 10_000_000_000 + index,
+            "dateAdded": "2021-01-01T00:00:00Z",
+            "quality": {"quality": {"id": 7, "name": "Bluray-1080p"}},
+            "mediaInfo": {
+                "audioCodec": "DTS",
+                "videoCodec": "x264",
+                "resolution": "1920x1080",
+            },
+            "id": 100_000 + index,
+        },
+        "popularity": 12.5,
+    }
+
+
+def measure(function):
+    # Time without tracemalloc, which slows allocations down considerably
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing the /movie response")
+    parser.add_argument("--movies", type=int, default=40000)
+    args = parser.parse_args()
+
+    script = load_script()
+    payload = json.dumps([build_movie(index) for index in range(args.movies)]).encode()
+
+    full, full_time, full_peak = measure(lambda: FakeResponse(payload).json())
+    del full
+    movies, stream_time, stream_peak = measure(
+        lambda: [
+            script.Movie(movie)
+            for movie in script.iter_json_array(FakeResponse(payload))
+        ]
+    )
+
+    print(f"Movies: {len(movies)}, payload: {len(payload) / 1024**2:.1f} MB")
+    print(f"response.json():  {full_time:.2f}s, peak {full_peak / 1024**2:.1f} MB")
+    print(f"streaming parser: {stream_time:.2f}s, peak {stream_peak / 1024**2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for the release date availability filter in not-cutoff-radarr.py.
+
+Compares the strptime based is_movie_available the script used to ship with
+against the precomputed release dates on a synthetic library.
+
+Usage: python3 benchmarks/release_dates.py [--movies 50000]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "not-cutoff-radarr.py")
+
+
+def load_script():
+    # The scripts import radarr_common.py from their own folder
+    sys.path.insert(0, os.path.dirname(SCRIPT_PATH))
+    spec = importlib.util.spec_from_file_location("not_cutoff_radarr", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def strptime_is_movie_available(movie):
+    # The original implementation, working on the raw /movie dicts
+    current_date = datetime.now().date()
+    if movie["status"] == "released":
+        if "physicalRelease" in movie:
+            physical_release_date = datetime.strptime(
+                movie["physicalRelease"], "%Y-%m-%dT%H:%M:%SZ"
+            ).date()
+            if physical_release_date <= current_date:
+                return True
+        if "digitalRelease" in movie:
+            digital_release_date = datetime.strptime(
+                movie["digitalRelease"], "%Y-%m-%dT%H:%M:%SZ"
+            ).date()
+            if digital_release_date <= current_date:
+                return True
+    return False
+
+
+def build_movie(index, rng):
+    movie = {
+        "id": index,
+        "title": f"Movie {index}",
+        "status": rng.choice(["released", "released", "released", "inCinemas"]),
+        "monitored": True,
+    }
+    year = rng.randint(1990, datetime.now().year + 1)
+    if rng.random() < 0.8:
+        movie["physicalRelease"] = f"{year}-{rng.randint(1, 12):02d}-15T00:00:00Z"
+    if rng.random() < 0.8:
+        movie["digitalRelease"] = f"{year}-{rng.randint(1, 12):02d}-01T00:00:00Z"
+    return movie
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the availability filter")
+    parser.add_argument("--movies", type=int, default=50000)
+    args = parser.parse_args()
+
+    script = load_script()
+    rng = random.Random(0)
+    raw_movies = [build_movie(index, rng) for index in range(args.movies)]
+
+    old, old_time = timed(
+        lambda: [movie for movie in raw_movies if strptime_is_movie_available(movie)]
+    )
+    movies, parse_time = timed(lambda: [script.Movie(movie) for movie in raw_movies])
+    new, filter_time = timed(lambda: script.filter_available_movies(movies))
+
+    assert [movie["id"] for movie in old] == [movie.id for movie in new], "filters disagree"
+
+    print(f"Movies: {args.movies}, available: {len(new)}")
+    print(f"strptime filter:        {old_time * 1000:.1f} ms")
+    print(f"build Movie records:    {parse_time * 1000:.1f} ms (done once while reading /movie)")
+    print(f"precomputed filter:     {filter_time * 1000:.1f} ms")
+    print(f"Speedup (filter only):  {old_time / filter_time:.0f}x")
+    print(f"Speedup (parse+filter): {old_time / (parse_time + filter_time):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,17 @@ This script checks for non-hardlinked movies in your Radarr library. When it fin
 """
 
 import csv
+import json
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
+from radarr_common import iter_json_array
+
 RADARR_URL = os.getenv(
     "RADARR_URL", "http://localhost:7878/radarr"
 )  # Replace with your Radarr URL
@@ -20,17 +25,78 @@ RADARR_API_KEY = os.getenv(
     "RADARR_API_KEY", "api_key"
 )  # Replace with your Radarr API key
 DIR_PATH = "/path/to/your/movie/directory"  # Replace with your movie directory path
+VIDEO_EXTENSIONS = (".mkv", ".mp4")  # File extensions that are checked for hardlinks
+SCAN_WORKERS = 8  # Number of movie folders that are scanned in parallel
+REPLACE_WORKERS = 1  # Number of movies that are replaced concurrently
+RADARR_RATE_LIMIT = 5  # Maximum Radarr API requests per second across all workers
+
+MOVIE_INDEX_CACHE = "radarr_movie_index.json"  # On-disk cache of the Radarr path index
+MOVIE_INDEX_TTL = 3600  # Seconds before the cached index is refetched from Radarr
+
+SEARCH_CHUNK_SIZE = 50  # Maximum number of movies per MoviesSearch command
+COMMAND_TIMEOUT = 120  # Seconds to wait for a Radarr command to finish
+
+JOURNAL_PATH = "replacements_journal.csv"  # Record of every unfinished replacement step
+JOURNAL_STEPS = ("deleted", "rescanned", "monitored", "searched")
 
 
-def get_non_hardlinked_files(dir_path):
+def scan_folder(folder_path, extensions):
     non_hardlinked_files = []
 
-    for root, dirs, files in os.walk(dir_path):
-        for file in files:
-            if file.endswith(".mkv" or ".mp4"):
-                file_path = os.path.join(root, file)
-                if os.path.isfile(file_path) and os.stat(file_path).st_nlink == 1:
-                    non_hardlinked_files.append(file_path)
+    try:
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                # Like os.walk, don't follow symlinked folders, they can loop
+                if entry.is_dir(follow_symlinks=False):
+                    non_hardlinked_files.extend(scan_folder(entry.path, extensions))
+                elif (
+                    entry.name.lower().endswith(extensions)
+                    and entry.is_file()
+                    and entry.stat().st_nlink == 1
+                ):
+                    non_hardlinked_files.append(entry.path)
+    except OSError as e:
+        # Skip a folder that can't be read or disappeared mid-scan, as os.walk did
+        print(f"Skipping {folder_path}: {e}")
+
+    return non_hardlinked_files
+
+
+def get_non_hardlinked_files(dir_path, extensions=VIDEO_EXTENSIONS, workers=SCAN_WORKERS):
+    """
+    Scans dir_path for files with one of the given extensions that have no other hardlinks.
+    Every top-level movie folder is scanned on its own thread, which mostly pays off
+    on network mounts where each stat is a round trip.
+    """
+    extensions = tuple(extension.lower() for extension in extensions)
+    non_hardlinked_files = []
+    folders = []
+
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                folders.append(entry.path)
+            elif (
+                entry.name.lower().endswith(extensions)
+                and entry.is_file()
+                and entry.stat().st_nlink == 1
+            ):
+                non_hardlinked_files.append(entry.path)
+
+    # Hand out folders in a few chunks per worker to keep the pool overhead low
+    workers = max(1, workers)
+    chunk_size = max(1, len(folders) // (workers * 4))
+    chunks = [folders[i : i + chunk_size] for i in range(0, len(folders), chunk_size)]
+
+    def scan_chunk(chunk):
+        chunk_files = []
+        for folder in chunk:
+            chunk_files.extend(scan_folder(folder, extensions))
+        return chunk_files
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_files in executor.map(scan_chunk, chunks):
+            non_hardlinked_files.extend(chunk_files)
 
     return non_hardlinked_files
 
@@ -57,74 +123,259 @@ def read_from_csv(csv_file_path):
     return non_hardlinked_files
 
 
-def get_movie_by_folder_path(folder_path):
-    response = requests.get(
-        f"{RADARR_URL}/api/v3/movie",
-        params={"apikey": RADARR_API_KEY},
-    )
+def read_journal(journal_path):
+    """
+    Replays the journal and returns a dict mapping every file path in it
+    to its movie id and the last step that was completed for it.
+    """
+    journal = {}
 
-    response.raise_for_status()
-    movies = response.json()
-
-    folder_path_abs = os.path.abspath(folder_path)
-
-    for movie in movies:
-        movie_path_abs = os.path.abspath(movie["path"])
-        if movie_path_abs == folder_path_abs:
-            return movie
+    try:
+        with open(journal_path, mode="r", newline="", encoding="utf-8") as journal_file:
+            for row in csv.reader(journal_file):
+                if len(row) != 4 or row[1] not in JOURNAL_STEPS:
+                    continue  # Skip a line that was cut off by a crash
+                timestamp, step, movie_id, file_path = row
+                journal[file_path] = (int(movie_id), step)
+    except FileNotFoundError:
+        pass
 
-    return None
+    return journal
 
 
-def refresh_movie(movie_id):
-    command_url = f"{RADARR_URL}/api/v3/command"
-    command_payload = {"name": "RescanMovie", "movieId": movie_id}
-    response = requests.post(
-        command_url, json=command_payload, params={"apikey": RADARR_API_KEY}
+def open_journal(journal_path):
+    # Terminate a line that was cut off by a crash so it can't swallow the next step
+    torn_line = False
+    try:
+        with open(journal_path, mode="rb") as journal_file:
+            journal_file.seek(0, os.SEEK_END)
+            if journal_file.tell() > 0:
+                journal_file.seek(-1, os.SEEK_END)
+                torn_line = journal_file.read(1) != b"\n"
+    except FileNotFoundError:
+        pass
+
+    journal_file = open(journal_path, mode="a", newline="", encoding="utf-8")
+    if torn_line:
+        journal_file.write("\n")
+
+    return journal_file
+
+
+def compact_journal(journal_path):
+    """
+    Rewrites the journal with only the replacements that have not been searched
+    yet, so it doesn't grow with every movie that was ever replaced.
+    """
+    unfinished = [
+        (movie_id, step, file_path)
+        for file_path, (movie_id, step) in read_journal(journal_path).items()
+        if step != "searched"
+    ]
+
+    tmp_path = f"{journal_path}.tmp"
+    with open(tmp_path, mode="w", newline="", encoding="utf-8") as journal_file:
+        for movie_id, step, file_path in unfinished:
+            write_journal(journal_file, step, movie_id, file_path)
+    os.replace(tmp_path, journal_path)
+
+
+journal_lock = threading.Lock()
+
+
+def write_journal(journal_file, step, movie_id, file_path):
+    with journal_lock:
+        csv.writer(journal_file).writerow(
+            [time.strftime("%Y-%m-%dT%H:%M:%S"), step, movie_id, file_path]
+        )
+        journal_file.flush()
+
+
+def normalize_path(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def fetch_movie_index():
+    response = radarr_request("GET", f"{RADARR_URL}/api/v3/movie", stream=True)
+
+    # Only keep what is needed to look a movie up by its folder
+    return {
+        normalize_path(movie["path"]): {
+            "id": movie["id"],
+            "title": movie["title"],
+            "path": movie["path"],
+        }
+        for movie in iter_json_array(response)
+        if movie.get("path")
+    }
+
+
+def load_movie_index(cache_path=MOVIE_INDEX_CACHE, ttl=MOVIE_INDEX_TTL, refresh=False):
+    """
+    Returns a dict mapping normalized folder paths to movies.
+    The index is read from cache_path if it is younger than ttl seconds,
+    otherwise it is fetched from Radarr once and written back to the cache.
+    """
+    if not refresh:
+        try:
+            with open(cache_path, mode="r", encoding="utf-8") as cache_file:
+                cache = json.load(cache_file)
+            if time.time() - cache["created"] < ttl:
+                return cache["movies"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    movie_index = fetch_movie_index()
+
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, mode="w", encoding="utf-8") as cache_file:
+        json.dump({"created": time.time(), "movies": movie_index}, cache_file)
+    os.replace(tmp_path, cache_path)
+
+    return movie_index
+
+
+def get_movie_by_folder_path(folder_path, movie_index):
+    return movie_index.get(normalize_path(folder_path))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that allows rate requests per second,
+    with bursts of up to burst requests.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+rate_limiter = TokenBucket(RADARR_RATE_LIMIT)
+
+
+def radarr_request(method, url, **kwargs):
+    rate_limiter.acquire()
+    response = requests.request(
+        method, url, params={"apikey": RADARR_API_KEY}, **kwargs
     )
     response.raise_for_status()
-    print(f"\nRefreshing movie (ID: {movie_id})")
-    time.sleep(5)  # Wait for the refresh to complete
+    return response
 
 
-def monitor_and_search_movie(movie_id, movie_file_path):
-    if not force:
-        user_input = input(f"Delete non-hardlinked movie: {movie_file_path}? (y/N): ")
-        if user_input.lower() != "y":
-            print("Skipping deletion.")
-            sys.exit(0)
+def wait_for_command(command_id, timeout=COMMAND_TIMEOUT):
+    """
+    Polls a Radarr command until it has finished, backing off between polls.
+    Returns True if the command completed successfully.
+    """
+    command_url = f"{RADARR_URL}/api/v3/command/{command_id}"
+    deadline = time.monotonic() + timeout
+    delay = 0.25
 
-    # Delete the movie file
-    try:
-        os.remove(movie_file_path)
-        print(f"Deleted non-hardlinked movie: {movie_file_path}")
-    except Exception as e:
-        print(f"Error deleting movie file: {e}")
-        return
+    while True:
+        response = radarr_request("GET", command_url)
+        status = response.json()["status"]
 
-    refresh_movie(movie_id)
+        if status == "completed":
+            return True
+        if status in ("failed", "aborted", "cancelled", "orphaned"):
+            print(f"Command {command_id} did not complete: {status}")
+            return False
+        if time.monotonic() + delay > deadline:
+            print(f"Timed out waiting for command {command_id} ({status})")
+            return False
 
-    movie_url = f"{RADARR_URL}/api/v3/movie/{movie_id}"
-    response = requests.get(movie_url, params={"apikey": RADARR_API_KEY})
-    response.raise_for_status()
-    movie = response.json()
-    movie["monitored"] = True
+        time.sleep(delay)
+        delay = min(delay * 2, 5)
 
-    response = requests.put(movie_url, json=movie, params={"apikey": RADARR_API_KEY})
-    response.raise_for_status()
 
+def refresh_movie(movie_id):
+    command_url = f"{RADARR_URL}/api/v3/command"
+    command_payload = {"name": "RescanMovie", "movieId": movie_id}
+    response = radarr_request("POST", command_url, json=command_payload)
+    print(f"\nRefreshing movie (ID: {movie_id})")
+    return wait_for_command(response.json()["id"])
+
+
+def replace_movie(movie_id, movie_file_path, journal_file, last_step=None):
+    """
+    Deletes, rescans and monitors a movie, writing each step to the journal.
+    Steps up to and including last_step are skipped when resuming.
+    """
+    if last_step is None:
+        # Delete the movie file
+        try:
+            os.remove(movie_file_path)
+            print(f"Deleted non-hardlinked movie: {movie_file_path}")
+        except Exception as e:
+            print(f"Error deleting movie file: {e}")
+            return False
+        write_journal(journal_file, "deleted", movie_id, movie_file_path)
+
+    if last_step in (None, "deleted"):
+        # Leave the journal at "deleted" so --resume rescans the movie again
+        if not refresh_movie(movie_id):
+            print(f"Error rescanning movie (ID: {movie_id}), not monitoring it yet")
+            return False
+        write_journal(journal_file, "rescanned", movie_id, movie_file_path)
+
+    if last_step in (None, "deleted", "rescanned"):
+        movie_url = f"{RADARR_URL}/api/v3/movie/{movie_id}"
+        movie = radarr_request("GET", movie_url).json()
+        movie["monitored"] = True
+
+        radarr_request("PUT", movie_url, json=movie)
+        write_journal(journal_file, "monitored", movie_id, movie_file_path)
+
+        print(f"Monitoring movie: {movie['title']} (ID: {movie['id']})")
+
+    return True
+
+
+def search_movies(movies, journal_file, chunk_size=SEARCH_CHUNK_SIZE):
+    """
+    Searches for the (movie id, file path) pairs in as few MoviesSearch commands
+    as possible and journals every movie once its search was sent.
+    """
     search_url = f"{RADARR_URL}/api/v3/command"
-    search_payload = {"name": "MoviesSearch", "movieIds": [movie_id]}
 
-    response = requests.post(
-        search_url, json=search_payload, params={"apikey": RADARR_API_KEY}
-    )
-    response.raise_for_status()
+    for i in range(0, len(movies), chunk_size):
+        chunk = movies[i : i + chunk_size]
+        movie_ids = [movie_id for movie_id, _ in chunk]
+        search_payload = {"name": "MoviesSearch", "movieIds": movie_ids}
+
+        radarr_request("POST", search_url, json=search_payload)
 
-    print(f"\nMonitoring and searching for movie: {movie['title']} (ID: {movie['id']})")
+        print(f"\nSearching for {len(movie_ids)} movies (IDs: {movie_ids})")
+        for movie_id, movie_file_path in chunk:
+            write_journal(journal_file, "searched", movie_id, movie_file_path)
 
 
-def process_movies(non_hardlinked_files, amount, force=False):
+def process_movies(
+    non_hardlinked_files,
+    amount,
+    force=False,
+    refresh_index=False,
+    search_chunk_size=SEARCH_CHUNK_SIZE,
+    resume=False,
+    workers=REPLACE_WORKERS,
+):
     print(f"\nLooking for non-hardlinked movies in {DIR_PATH}...\n")
     print(f"Found {len(non_hardlinked_files)} non-hardlinked movies.", end="")
     if len(non_hardlinked_files) > 0:
@@ -135,19 +386,68 @@ def process_movies(non_hardlinked_files, amount, force=False):
     else:
         print("\n")
 
+    # Finish whatever an interrupted run left behind before starting on new files
+    pending = []
+    if resume:
+        journal = read_journal(JOURNAL_PATH)
+        pending = [
+            (file_path, movie_id, step)
+            for file_path, (movie_id, step) in journal.items()
+            if step != "searched"
+        ]
+        # Files that were searched already may have lost their hardlink again
+        unfinished = {file_path for file_path, _, _ in pending}
+        non_hardlinked_files = [
+            file_path
+            for file_path in non_hardlinked_files
+            if file_path not in unfinished
+        ]
+        print(f"Resuming {len(pending)} unfinished replacements from {JOURNAL_PATH}")
+
+    movie_index = {}
+    if amount > 0 and len(non_hardlinked_files) > 0:
+        movie_index = load_movie_index(refresh=refresh_index)
+
+    # Ask for every deletion up front so the replacements can run unattended
+    jobs = [(movie_id, file_path, step) for file_path, movie_id, step in pending]
+
     for movie_file_path in non_hardlinked_files[:amount]:
         folder_path = os.path.dirname(movie_file_path)
-        movie = get_movie_by_folder_path(folder_path)
-
-        if movie:
-            monitor_and_search_movie(movie["id"], movie_file_path)
-            non_hardlinked_files.remove(movie_file_path)
-            with open("non_hardlinked_files.csv", "w") as f:
-                f.write("File Path\n")
-                for remaining_file in non_hardlinked_files:
-                    f.write(f"{remaining_file}\n")
-        else:
+        movie = get_movie_by_folder_path(folder_path, movie_index)
+
+        if not movie:
             print(f"Movie not found in Radarr for folder path: {folder_path}")
+            continue
+
+        if not force:
+            user_input = input(
+                f"Delete non-hardlinked movie: {movie_file_path}? (y/N): "
+            )
+            if user_input.lower() != "y":
+                print("Skipping deletion.")
+                break
+
+        jobs.append((movie["id"], movie_file_path, None))
+
+    with open_journal(JOURNAL_PATH) as journal_file:
+
+        def run_job(job):
+            movie_id, movie_file_path, step = job
+            try:
+                if step == "monitored" or replace_movie(
+                    movie_id, movie_file_path, journal_file, step
+                ):
+                    return movie_id, movie_file_path
+            except requests.exceptions.RequestException as e:
+                print(f"Error replacing movie (ID: {movie_id}): {e}")
+            return None
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            replaced = [result for result in executor.map(run_job, jobs) if result]
+
+        search_movies(replaced, journal_file, search_chunk_size)
+
+    compact_journal(JOURNAL_PATH)
 
 
 def show_help():
@@ -157,6 +457,15 @@ Options:
 
   --replace <amount>   Replace specified amount of non-hardlinked movies
   --force              Automatically delete non-hardlinked movies without confirmation (Must be called with --replace <amount>)
+  --refresh-index      Ignore the cached Radarr movie index and fetch it again
+  --dir <path>         Directory to scan instead of DIR_PATH
+  --extensions <list>  Comma separated file extensions to check (default: .mkv,.mp4)
+  --scan-workers <n>   Number of movie folders to scan in parallel (default: 8)
+  --workers <amount>   Number of movies to replace concurrently (default: 1)
+  --rate <amount>      Maximum Radarr API requests per second across all workers (default: 5)
+  --search-chunk <n>   Maximum number of movies per search command (default: 50)
+  --resume             Finish replacements an interrupted run left in replacements_journal.csv
+                       and continue with non_hardlinked_files.csv without scanning again
   --help               Display this help text
   
   If no flags are specified, the script will only save non-hardlinked movies to non_hardlinked_files.csv
@@ -173,19 +482,69 @@ if __name__ == "__main__":
         else:
             print("Error: --dir argument given but no path specified.")
             sys.exit(1)
+    if "--extensions" in sys.argv:
+        extensions_index = sys.argv.index("--extensions") + 1
+        if extensions_index < len(sys.argv):
+            VIDEO_EXTENSIONS = tuple(
+                f".{extension.strip().lstrip('.')}"
+                for extension in sys.argv[extensions_index].split(",")
+                if extension.strip()
+            )
+        else:
+            print("Error: --extensions argument given but no extensions specified.")
+            sys.exit(1)
+    if "--scan-workers" in sys.argv:
+        workers_index = sys.argv.index("--scan-workers") + 1
+        if workers_index < len(sys.argv):
+            SCAN_WORKERS = int(sys.argv[workers_index])
+        else:
+            print("Error: --scan-workers argument given but no amount specified.")
+            sys.exit(1)
+    if "--workers" in sys.argv:
+        workers_index = sys.argv.index("--workers") + 1
+        if workers_index < len(sys.argv):
+            REPLACE_WORKERS = int(sys.argv[workers_index])
+        else:
+            print("Error: --workers argument given but no amount specified.")
+            sys.exit(1)
+    if "--rate" in sys.argv:
+        rate_index = sys.argv.index("--rate") + 1
+        if rate_index < len(sys.argv):
+            RADARR_RATE_LIMIT = float(sys.argv[rate_index])
+            rate_limiter = TokenBucket(RADARR_RATE_LIMIT)
+        else:
+            print("Error: --rate argument given but no amount specified.")
+            sys.exit(1)
+    if "--search-chunk" in sys.argv:
+        chunk_index = sys.argv.index("--search-chunk") + 1
+        if chunk_index < len(sys.argv):
+            SEARCH_CHUNK_SIZE = int(sys.argv[chunk_index])
+        else:
+            print("Error: --search-chunk argument given but no amount specified.")
+            sys.exit(1)
     if "--help" in sys.argv:
         show_help()
         sys.exit(0)
 
     csv_file_path = "non_hardlinked_files.csv"
 
-    non_hardlinked_files = get_non_hardlinked_files(DIR_PATH)
-    save_to_csv(non_hardlinked_files, csv_file_path)
+    resume = "--resume" in sys.argv
+
+    if resume and os.path.exists(csv_file_path):
+        non_hardlinked_files = read_from_csv(csv_file_path)
+    else:
+        non_hardlinked_files = get_non_hardlinked_files(
+            DIR_PATH, VIDEO_EXTENSIONS, SCAN_WORKERS
+        )
+        save_to_csv(non_hardlinked_files, csv_file_path)
 
     force = False
     if "--force" in sys.argv:
         force = True
 
+    refresh_index = "--refresh-index" in sys.argv
+
+    amount = 0
     if len(sys.argv) > 1 and sys.argv[1] == "--replace":
         if len(sys.argv) < 3:
             print(
@@ -194,7 +553,13 @@ if __name__ == "__main__":
             sys.exit(1)
 
         amount = int(sys.argv[2])
-        non_hardlinked_files = read_from_csv(csv_file_path)
-        process_movies(non_hardlinked_files, amount, force)
-    else:
-        process_movies(non_hardlinked_files, 0, force)
+
+    process_movies(
+        non_hardlinked_files,
+        amount,
+        force=force,
+        refresh_index=refresh_index,
+        search_chunk_size=SEARCH_CHUNK_SIZE,
+        resume=resume,
+        workers=REPLACE_WORKERS,
+    )
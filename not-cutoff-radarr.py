@@ -1,11 +1,19 @@
 import argparse
+import hashlib
+import json
 import os
-import random
 import sys
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
+from radarr_common import (
+    SearchScheduler,
+    earliest_release_date,
+    iter_json_array,
+    today_release_date,
+)
+
 """
 Author: soup
 Description: This script will check for movies in Radarr that do not have the given custom format assigned and are considered released.
@@ -22,41 +30,130 @@ CUSTOM_FORMAT_NAMES = [
     "HD Bluray Tier 01",
     "HD Bluray Tier 02",
 ]  # Change this to the names of the custom formats you want to filter by
+MOVIE_FILE_BATCH_SIZE = 100  # Number of movies per bulk moviefile request
+MOVIE_FILE_WORKERS = 8  # Number of concurrent moviefile requests
+CUSTOM_FORMAT_CACHE = "custom_format_cache.json"  # Custom formats of every movie file seen
+SEARCH_CHUNK_SIZE = 100  # Maximum number of movies per MoviesSearch command
+SEARCH_SCHEDULE_DB = "search_schedule.sqlite"  # When each movie was last searched
+DAILY_SEARCH_BUDGET = None  # Maximum number of searches per day across runs, None for no limit
+
+# Pooled session so the moviefile requests reuse their connections
+session = requests.Session()
+session.mount(
+    "http://",
+    requests.adapters.HTTPAdapter(pool_maxsize=MOVIE_FILE_WORKERS),
+)
+session.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_maxsize=MOVIE_FILE_WORKERS),
+)
+
+
+class MovieFile:
+    __slots__ = ("id", "date_added", "size", "custom_format_ids")
+
+    def __init__(self, movie_file):
+        self.id = movie_file["id"]
+        self.date_added = movie_file.get("dateAdded")
+        self.size = movie_file.get("size")
+        # None unless Radarr already included the custom formats in /movie
+        self.custom_format_ids = (
+            [format["id"] for format in movie_file["customFormats"]]
+            if "customFormats" in movie_file
+            else None
+        )
 
 
-def is_movie_available(movie):
-    current_date = datetime.now().date()
-    if movie["status"] == "released":
-        if "physicalRelease" in movie:
-            physical_release_date = datetime.strptime(
-                movie["physicalRelease"], "%Y-%m-%dT%H:%M:%SZ"
-            ).date()
-            if physical_release_date <= current_date:
-                return True
-        if "digitalRelease" in movie:
-            digital_release_date = datetime.strptime(
-                movie["digitalRelease"], "%Y-%m-%dT%H:%M:%SZ"
-            ).date()
-            if digital_release_date <= current_date:
-                return True
-    return False
-
-
-def monitor_movie(movie):
-    update_url = (
-        f'{RADARR_URL}/api/v3/movie/{movie["id"]}?apiKey={RADARR_API_KEY}'
+class Movie:
+    """The fields of a Radarr movie this script needs, without the rest of the payload."""
+
+    __slots__ = (
+        "id",
+        "title",
+        "status",
+        "monitored",
+        "available_from",
+        "movie_file",
     )
+
+    def __init__(self, movie):
+        self.id = movie["id"]
+        self.title = movie["title"]
+        self.status = movie["status"]
+        self.monitored = movie["monitored"]
+        # A movie is available once it is out physically or digitally, whichever is first
+        self.available_from = earliest_release_date(movie)
+        self.movie_file = (
+            MovieFile(movie["movieFile"]) if "movieFile" in movie else None
+        )
+
+
+def filter_available_movies(movies, today=None):
+    # Compare the precomputed release dates against a single "today" in one pass
+    if today is None:
+        today = today_release_date()
+    return [
+        movie
+        for movie in movies
+        if movie.status == "released"
+        and movie.available_from is not None
+        and movie.available_from <= today
+    ]
+
+
+def monitor_movies(movies):
+    """Sets every unmonitored movie to monitored with a single movie editor request."""
+    unmonitored_movies = [movie for movie in movies if not movie.monitored]
+    if not unmonitored_movies:
+        return 0
+
+    update_url = f"{RADARR_URL}/api/v3/movie/editor?apiKey={RADARR_API_KEY}"
     headers = {"Content-Type": "application/json"}
-    payload = movie
-    payload["monitored"] = True
+    payload = {
+        "movieIds": [movie.id for movie in unmonitored_movies],
+        "monitored": True,
+    }
     response = requests.put(update_url, json=payload, headers=headers)
 
     if response.status_code not in [200, 202]:
         print(
-            f"Error updating monitored status for movie ID {movie['id']}: {response.status_code}"
+            f"Error updating monitored status for {len(unmonitored_movies)} movies: {response.status_code}"
         )
-        return False
-    return True
+        return 0
+
+    for movie in unmonitored_movies:
+        movie.monitored = True
+    return len(unmonitored_movies)
+
+
+def search_movies(movies, chunk_size=SEARCH_CHUNK_SIZE):
+    search_url = f"{RADARR_URL}/api/v3/command"
+    searched_movies = []
+
+    for i in range(0, len(movies), chunk_size):
+        chunk = movies[i : i + chunk_size]
+        search_payload = {
+            "name": "MoviesSearch",
+            "movieIds": [movie.id for movie in chunk],
+        }
+        response = requests.post(
+            search_url,
+            json=search_payload,
+            params={"apiKey": RADARR_API_KEY},
+        )
+        if response.status_code == 201:
+            searched_movies.extend(chunk)
+        for movie in chunk:
+            if response.status_code == 201:
+                print(
+                    f'Search for upgraded version of "{movie.title}" has been triggered.'
+                )
+            else:
+                print(
+                    f'Error searching for upgraded version of "{movie.title}": {response.status_code}'
+                )
+
+    return searched_movies
 
 
 def fetch_custom_formats():
@@ -84,36 +181,145 @@ def find_custom_format_ids(custom_formats, custom_format_names):
 
 def fetch_movies():
     response = requests.get(
-        f"{RADARR_URL}/api/v3/movie", params={"apiKey": RADARR_API_KEY}
+        f"{RADARR_URL}/api/v3/movie",
+        params={"apiKey": RADARR_API_KEY},
+        stream=True,
     )
     if response.status_code == 200:
-        return response.json()
+        return [Movie(movie) for movie in iter_json_array(response)]
     else:
         print(f"Error fetching movies: {response.status_code}")
         return []
 
 
-def filter_movies(movies, custom_format_ids, match):
-    filtered_movies = []
+def hash_custom_formats(custom_formats):
+    payload = json.dumps(custom_formats, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def load_custom_format_cache(definitions_hash, cache_path=CUSTOM_FORMAT_CACHE):
+    """
+    Returns the cached custom formats per movie file id, or an empty cache
+    if the custom format definitions changed since it was written.
+    """
+    try:
+        with open(cache_path, "r", encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+        if cache["definitions"] == definitions_hash:
+            return cache
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {"definitions": definitions_hash, "files": {}}
+
+
+def save_custom_format_cache(cache, cache_path=CUSTOM_FORMAT_CACHE):
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(tmp_path, cache_path)
+
+
+def fetch_movie_file_batch(movie_ids):
+    response = session.get(
+        f"{RADARR_URL}/api/v3/moviefile",
+        params={"apiKey": RADARR_API_KEY, "movieId": movie_ids},
+    )
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+
+def fetch_movie_file(movie):
+    response = session.get(
+        f"{RADARR_URL}/api/v3/moviefile/{movie.movie_file.id}",
+        params={"apiKey": RADARR_API_KEY},
+    )
+    if response.status_code != 200:
+        print(
+            f"Error fetching movie file for {movie.title}: {response.status_code}"
+        )
+        return None
+    return response.json()
+
+
+def fetch_custom_format_ids(movies, cache=None):
+    """
+    Returns a dict mapping movie file ids to the ids of their custom formats.
+    Custom formats already included in the /movie payload or cached for the
+    same file (same dateAdded and size) are used as is, the rest are fetched
+    in batches, falling back to one request per file if Radarr does not
+    support fetching several movies at once.
+    """
+    movie_custom_format_ids = {}
+    cached_files = cache["files"] if cache is not None else {}
+    seen_files = {}
+    missing = []
+
     for movie in movies:
-        if not is_movie_available(movie):
+        movie_file = movie.movie_file
+        if movie_file is None:
             continue
+        file_key = [movie_file.date_added, movie_file.size]
+        seen_files[str(movie_file.id)] = file_key
+        cached = cached_files.get(str(movie_file.id))
+        if movie_file.custom_format_ids is not None:
+            movie_custom_format_ids[movie_file.id] = movie_file.custom_format_ids
+        elif cached is not None and cached[:2] == file_key:
+            movie_custom_format_ids[movie_file.id] = cached[2]
+        else:
+            missing.append(movie)
+
+    batches = [
+        missing[i : i + MOVIE_FILE_BATCH_SIZE]
+        for i in range(0, len(missing), MOVIE_FILE_BATCH_SIZE)
+    ]
+
+    with ThreadPoolExecutor(max_workers=MOVIE_FILE_WORKERS) as executor:
+        movie_files = []
+        for batch_files in executor.map(
+            lambda batch: fetch_movie_file_batch([movie.id for movie in batch]),
+            batches,
+        ):
+            movie_files.extend(batch_files or [])
+
+        # Anything the bulk requests did not return is fetched one by one
+        fetched_ids = {movie_file["id"] for movie_file in movie_files}
+        failed = [
+            movie for movie in missing if movie.movie_file.id not in fetched_ids
+        ]
+        movie_files.extend(
+            movie_file
+            for movie_file in executor.map(fetch_movie_file, failed)
+            if movie_file is not None
+        )
+
+    for movie_file in movie_files:
+        movie_custom_format_ids[movie_file["id"]] = [
+            format["id"] for format in movie_file.get("customFormats", [])
+        ]
+
+    # Only keep files that still exist so the cache doesn't grow forever
+    if cache is not None:
+        cache["files"] = {
+            file_id: file_key + [movie_custom_format_ids[int(file_id)]]
+            for file_id, file_key in seen_files.items()
+            if int(file_id) in movie_custom_format_ids
+        }
+
+    return movie_custom_format_ids
+
+
+def filter_movies(movies, custom_format_ids, match, cache=None):
+    available_movies = filter_available_movies(movies)
+    movie_file_custom_format_ids = fetch_custom_format_ids(available_movies, cache)
+
+    filtered_movies = []
+    for movie in available_movies:
         movie_custom_format_ids = []  # default to empty list
-        if "movieFile" in movie:
-            movie_file_response = requests.get(
-                f'{RADARR_URL}/api/v3/moviefile/{movie["movieFile"]["id"]}',
-                params={"apiKey": RADARR_API_KEY},
+        if movie.movie_file is not None:
+            movie_custom_format_ids = movie_file_custom_format_ids.get(
+                movie.movie_file.id, []
             )
-            if movie_file_response.status_code == 200:
-                movie_file = movie_file_response.json()
-                movie_custom_format_ids = [
-                    format["id"]
-                    for format in movie_file.get("customFormats", [])
-                ]
-            else:
-                print(
-                    f'Error fetching movie file for {movie["title"]}: {movie_file_response.status_code}'
-                )
         if match == "any":
             if not any(
                 custom_format_id in movie_custom_format_ids
@@ -130,14 +336,8 @@ def filter_movies(movies, custom_format_ids, match):
 
 
 def monitor_filtered_movies(filtered_movies):
-    unmonitored_count = 0
     filtered_count = len(filtered_movies)
-
-    for movie in filtered_movies:
-        if not movie["monitored"]:
-            if monitor_movie(movie):
-                movie["monitored"] = True
-                unmonitored_count += 1
+    unmonitored_count = monitor_movies(filtered_movies)
 
     return unmonitored_count, filtered_count
 
@@ -158,6 +358,13 @@ def parse_args():
         default="all",
         help="Choose whether any or all custom formats need to match ('any' or 'all' defaults to 'all').",
     )
+    parser.add_argument(
+        "--daily-budget",
+        type=int,
+        metavar="N",
+        default=DAILY_SEARCH_BUDGET,
+        help="Search for at most N movies per day, counted across runs.",
+    )
 
     return parser.parse_args()
 
@@ -182,8 +389,12 @@ def main():
             f"Error: None of the custom formats {CUSTOM_FORMAT_NAMES} were found"
         )
     else:
+        cache = load_custom_format_cache(hash_custom_formats(custom_formats))
         movies = fetch_movies()
-        filtered_movies = filter_movies(movies, custom_format_ids, args.match)
+        filtered_movies = filter_movies(
+            movies, custom_format_ids, args.match, cache
+        )
+        save_custom_format_cache(cache)
 
         # Add this line to print the total count of filtered movies
         print(
@@ -209,7 +420,7 @@ def main():
         else:
             with open("not-cutoff.txt", "w") as f:
                 for movie in filtered_movies:
-                    f.write(movie["title"] + "\n")
+                    f.write(movie.title + "\n")
             print("List of movies has been saved to not-cutoff.txt")
 
             try:
@@ -218,28 +429,17 @@ def main():
                 num_search = 0
 
             if num_search > 0:
-                random_movies = random.sample(filtered_movies, num_search)
-                for movie in random_movies:
-                    if not movie["monitored"]:
-                        monitor_movie(movie)
-                    search_url = f"{RADARR_URL}/api/v3/command"
-                    search_payload = {
-                        "name": "MoviesSearch",
-                        "movieIds": [movie["id"]],
-                    }
-                    response = requests.post(
-                        search_url,
-                        json=search_payload,
-                        params={"apiKey": RADARR_API_KEY},
+                # Search the movies that have waited the longest since their last search
+                scheduler = SearchScheduler(
+                    SEARCH_SCHEDULE_DB, "cutoff", args.daily_budget
+                )
+                picked_movies = scheduler.pick(filtered_movies, num_search)
+                if len(picked_movies) < num_search and args.daily_budget is not None:
+                    print(
+                        f"Daily search budget of {args.daily_budget} allows {len(picked_movies)} more searches today."
                     )
-                    if response.status_code == 201:
-                        print(
-                            f"Search for upgraded version of \"{movie['title']}\" has been triggered."
-                        )
-                    else:
-                        print(
-                            f"Error searching for upgraded version of \"{movie['title']}\": {response.status_code}"
-                        )
+                monitor_movies(picked_movies)
+                scheduler.record(search_movies(picked_movies))
 
 
 if __name__ == "__main__":
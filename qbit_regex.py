@@ -10,12 +10,21 @@ or "noHL unmatched", respectively.
 """
 
 import argparse
+import json
 import os
 import re
+import string
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import requests
 
+try:
+    import tomllib
+except ImportError:  # Python < 3.11, rules files then have to be JSON
+    tomllib = None
+
 # Add your qBittorrent Web UI credentials here or call them from the command line
 # Environment variables are used by default if not specified here or on the command line
 QB_URL = os.environ.get("QB_URL", "http://localhost:8080")
@@ -30,52 +39,583 @@ NOHL_EPISODES_TAG = "noHL episodes"
 NOHL_SEASONS_TAG = "noHL seasons"
 NOHL_UNMATCHED_TAG = "noHL unmatched"
 
+TAG_BATCH_SIZE = 500  # Hashes per addTags/removeTags request, keeps the request body small
+TORRENT_FIELDS = ("hash", "name", "tags", "category")  # All the classifier needs from torrents/info
+FLUSH_INTERVAL = 60  # Seconds between tag updates in --daemon mode
+RULES_FILE = None  # Optional TOML/JSON file with your own patterns and tags, see the README
+
 # Regex patterns for season packs, episodes, and unmatched torrents
 # Do not change these unless you know what you are doing
 SEASONS_REGEX_PATTERN = r"(?i).*\bS\d+\b(?!E\d+\b).*"
 EPISODES_REGEX_PATTERN = r"(?i).*\bS\d+(?=E\d+\b).*"
 UNMATCHED_REGEX_PATTERN = r"(?i)(?!.*\bS\d+\b(?!E\d+\b)|.*\bS\d+(?=E\d+\b)).*"
 
+# The patterns above as a single scan: an "S01" token is a season, an "S01E02" token
+# an episode. A name can contain both, then it is tagged as both like before.
+RELEASE_REGEX = re.compile(r"\bS\d+(E\d+)?\b", re.IGNORECASE)
+SEASON_REGEX = re.compile(r"\bS\d+\b", re.IGNORECASE)
+EPISODE_REGEX = re.compile(r"\bS\d+E\d+\b", re.IGNORECASE)
+
+SEASON = "season"
+EPISODE = "episode"
+UNMATCHED = "unmatched"
+
+SEASON_ONLY = frozenset((SEASON,))
+EPISODE_ONLY = frozenset((EPISODE,))
+SEASON_AND_EPISODE = frozenset((SEASON, EPISODE))
+UNMATCHED_ONLY = frozenset((UNMATCHED,))
 
-def delete_tags():
+# re.IGNORECASE matches these to "i", casefold() doesn't
+CASEFOLD_FIXES = str.maketrans("\u0130\u0131", "ii")
+
+
+def classify(torrent_name: str) -> frozenset:
+    """
+    Returns the classes of a torrent name: SEASON, EPISODE, both, or UNMATCHED.
+    Gives the same result as matching SEASONS_REGEX_PATTERN and
+    EPISODES_REGEX_PATTERN, but scans the name once: after the first season
+    or episode token only the rest of the name is searched for the other one.
+    """
+    match = RELEASE_REGEX.search(torrent_name)
+    if match is None:
+        return UNMATCHED_ONLY
+    if match.group(1) is None:
+        if EPISODE_REGEX.search(torrent_name, match.end()):
+            return SEASON_AND_EPISODE
+        return SEASON_ONLY
+    if SEASON_REGEX.search(torrent_name, match.end()):
+        return SEASON_AND_EPISODE
+    return EPISODE_ONLY
+
+
+def literal_prefix(pattern):
+    """
+    Splits a pattern into the tokens it starts with that rules can share,
+    \b and plain ASCII characters, and the rest of the pattern.
+    """
+    if "|" in pattern:
+        return [], pattern  # The alternation may not apply to the whole pattern
+    tokens = []
+    position = 0
+    while position < len(pattern):
+        if pattern.startswith(r"\b", position):
+            token, size = r"\b", 2
+        elif pattern[position] in string.ascii_letters + string.digits:
+            token, size = pattern[position], 1
+        elif (
+            pattern[position] == "\\"
+            and position + 1 < len(pattern)
+            and pattern[position + 1] in string.punctuation
+        ):
+            token, size = pattern[position + 1], 2  # An escaped character like \.
+        else:
+            break
+        if pattern[position + size : position + size + 1] in ("?", "*", "+", "{"):
+            break  # A repeated token is not a fixed prefix
+        tokens.append(token)
+        position += size
+    return tokens, pattern[position:]
+
+
+def group_end(pattern, position):
+    """Returns the index after the group or character class that starts at position."""
+    depth = 0
+    while position < len(pattern):
+        character = pattern[position]
+        if character == "\\":
+            position += 2
+            continue
+        if character == "[":
+            position += 2 if pattern.startswith("[^", position) else 1
+            position += 1  # A "]" right after "[" or "[^" is a literal
+            while position < len(pattern) and pattern[position] != "]":
+                position += 2 if pattern[position] == "\\" else 1
+            if depth == 0:
+                return position + 1
+        elif character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return len(pattern)
+
+
+def required_literal(pattern):
+    """
+    Returns the longest run of plain ASCII characters that every match of
+    pattern contains, or "" if it can't tell. Only the top level of the
+    pattern is looked at, and groups like (?:WORD) that hold nothing else.
+    """
+    if "|" in pattern:
+        return ""  # The run may only be needed by one side of the alternation
+    longest = run = ""
+    position = 0
+    while position < len(pattern):
+        character = pattern[position]
+        text = None
+        if character in string.ascii_letters + string.digits:
+            text, end = character, position + 1
+        elif character == "\\":
+            escaped = pattern[position + 1 : position + 2]
+            if escaped and escaped in string.punctuation:
+                text = escaped
+            elif not escaped or escaped not in "dDwWsSbBAZ":
+                break  # An escape like \x41 or \1, stop before misreading it
+            end = position + 2
+        elif character in "([":
+            end = group_end(pattern, position)
+            inner = pattern[position:end]
+            if inner.startswith("(?:"):
+                inner = inner[3:-1]
+            elif inner.startswith("(") and not inner.startswith("(?"):
+                inner = inner[1:-1]
+            else:
+                inner = None
+            if inner:
+                tokens, rest = literal_prefix(inner)
+                if tokens and not rest and r"\b" not in tokens:
+                    text = "".join(tokens)
+        elif character == "{":
+            end = pattern.find("}", position) + 1 or len(pattern)
+        else:
+            end = position + 1
+
+        quantifier = pattern[end : end + 1]
+        if text is None or quantifier in ("?", "*", "{"):
+            run = ""  # Not plain text, or text that may be missing
+        else:
+            run += text
+            if quantifier == "+":
+                longest = max(longest, run, key=len)
+                run = ""  # Repeats of the last character may follow
+        longest = max(longest, run, key=len)
+        position = end
+    return max(longest, run, key=len)
+
+
+def first_character(tokens):
+    return next((token for token in tokens if token != r"\b"), None)
+
+
+def combine_rules(rules):
+    """
+    Builds the alternation of rules, a list of (prefix tokens, rest, index) in
+    priority order, with common prefixes factored out into a trie, so the
+    regex engine decides between rules one character at a time instead of
+    trying every rule at every position. Rules only change places when they
+    can't match at the same position because they start with different
+    characters, so the first match is the same as with a plain alternation.
+    """
+    ordered = []
+    for rule in rules:
+        position = len(ordered)
+        character = first_character(rule[0])
+        if character is not None:
+            for earlier in range(len(ordered) - 1, -1, -1):
+                other = ordered[earlier]
+                if other[0] and other[0][0] == rule[0][0]:
+                    position = earlier + 1
+                    break
+                if first_character(other[0]) in (None, character):
+                    break
+        ordered.insert(position, rule)
+
+    branches = []
+    start = 0
+    while start < len(ordered):
+        tokens, rest, index = ordered[start]
+        end = start + 1
+        while end < len(ordered) and tokens and ordered[end][0][:1] == tokens[:1]:
+            end += 1
+        if end - start == 1:
+            prefix = "".join(
+                token if token == r"\b" else re.escape(token) for token in tokens
+            )
+            branches.append(f"(?P<rule{index}>{prefix}{rest})")
+        else:
+            head = tokens[0] if tokens[0] == r"\b" else re.escape(tokens[0])
+            shared = [
+                (tokens[1:], rest, index) for tokens, rest, index in ordered[start:end]
+            ]
+            branches.append(f"{head}(?:{combine_rules(shared)})")
+        start = end
+    return "|".join(branches)
+
+
+class RuleSet:
+    """
+    Patterns and tags from a rules file. Rules that start with a literal
+    character are compiled into one regex with a named group per rule, so
+    their shared prefixes are only checked once. A rule without one would be
+    tried at every position of every name there, so those rules are searched
+    on their own instead, and only in names that contain the text the rule
+    requires. The first match wins: the rule that matches earliest in the
+    name, and of rules matching at the same position the one listed first.
+    Names no rule matches get unmatched_tag, if there is one.
     """
-    Deletes specific tags before processing the torrents.
-    This is to ensure that the torrents that are no longer
-    tagged with noHL are removed from the equation.
 
-    It only deletes the following tags:
-    NOHL_EPISODES_TAG
-    NOHL_SEASONS_TAG
-    NOHL_UNMATCHED_TAG
+    def __init__(self, rules, unmatched_tag=NOHL_UNMATCHED_TAG, ignore_case=True):
+        if not rules:
+            raise ValueError("no rules given")  # An empty regex would match every name
+        self.tags = [tag for _, tag in rules]
+        self.unmatched_tag = unmatched_tag
+
+        self.ignore_case = ignore_case
+        flags = re.IGNORECASE if ignore_case else 0
+        # The class of a name is the tag of its rule, several rules can share a tag
+        classes = [frozenset((tag,)) for _, tag in rules]
+
+        prefixes = []
+        self.searches = []  # (required text, regex, index, classes) of the other rules
+        for index, (pattern, _) in enumerate(rules):
+            tokens, rest = literal_prefix(pattern)
+            if first_character(tokens) is None:
+                literal = required_literal(pattern)
+                self.searches.append(
+                    (
+                        literal.casefold() if ignore_case else literal,
+                        re.compile(pattern, flags),
+                        index,
+                        classes[index],
+                    )
+                )
+                continue
+            if ignore_case:  # "S" and "s" are then the same prefix
+                tokens = [token.casefold() for token in tokens]
+            prefixes.append((tokens, rest, index))
+        self.regex = re.compile(combine_rules(prefixes), flags) if prefixes else None
+        self.groups = {
+            f"rule{index}": (index, classes[index]) for _, _, index in prefixes
+        }
+
+    def classify(self, torrent_name: str) -> frozenset:
+        best = None  # (start, index, classes) of the first match so far
+        if self.regex is not None:
+            match = self.regex.search(torrent_name)
+            if match is not None:
+                # The rule's group encloses any groups of its own pattern, so it closes last
+                best = (match.start(), *self.groups[match.lastgroup])
+        if self.searches:
+            text = torrent_name
+            if self.ignore_case:
+                if not text.isascii():
+                    text = text.translate(CASEFOLD_FIXES)
+                text = text.casefold()
+            for literal, regex, index, classes in self.searches:
+                if literal not in text:
+                    continue  # A cheap substring check rules out most names
+                match = regex.search(torrent_name)
+                if match is not None and (
+                    best is None or (match.start(), index) < best[:2]
+                ):
+                    best = (match.start(), index, classes)
+        return UNMATCHED_ONLY if best is None else best[2]
+
+    def managed_tags(self):
+        managed = [(tag, tag) for tag in dict.fromkeys(self.tags)]
+        if self.unmatched_tag:
+            managed.append((UNMATCHED, self.unmatched_tag))
+        return managed
+
+
+def load_rules(path):
+    """
+    Reads a rules file like
+        {"unmatched_tag": "noHL unmatched",
+         "rules": [{"pattern": "\\bS\\d+E\\d+\\b", "tag": "noHL episodes"}, ...]}
+    or the same as TOML with [[rules]] tables.
+    """
+    try:
+        with open(path, "rb") as rules_file:
+            if path.endswith(".toml"):
+                if tomllib is None:
+                    print("Error: TOML rules files need Python 3.11+, use JSON instead.")
+                    exit(1)
+                config = tomllib.load(rules_file)
+            else:
+                config = json.load(rules_file)
+        return RuleSet(
+            [(rule["pattern"], rule["tag"]) for rule in config["rules"]],
+            config.get("unmatched_tag", NOHL_UNMATCHED_TAG),
+            config.get("ignore_case", True),
+        )
+    except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+        print(f"Failed to load rules from {path}: {e}")
+        exit(1)
+
+
+def load_classifier(args):
+    """Returns the (class, tag) pairs to manage and the function that classifies a name."""
+    if args.rules:
+        rules = load_rules(args.rules)
+        return rules.managed_tags(), rules.classify
+    return managed_tags(args), classify
+
+
+def managed_tags(args):
+    """Returns (class, tag) for every class the script was asked to tag."""
+    return [
+        (torrent_class, tag)
+        for enabled, torrent_class, tag in (
+            (args.seasons, SEASON, NOHL_SEASONS_TAG),
+            (args.episodes, EPISODE, NOHL_EPISODES_TAG),
+            (args.unmatched, UNMATCHED, NOHL_UNMATCHED_TAG),
+        )
+        if enabled
+    ]
+
+
+def fetch_tagged_hashes(session, tags):
+    """
+    Returns the hashes of all torrents that currently carry each tag, across
+    the whole client, with one concurrent torrents/info request per tag.
     """
-    tags_to_delete = []
 
-    if args.seasons:
-        tags_to_delete.append(NOHL_SEASONS_TAG)
-    if args.episodes:
-        tags_to_delete.append(NOHL_EPISODES_TAG)
-    if args.unmatched:
-        tags_to_delete.append(NOHL_UNMATCHED_TAG)
+    def fetch_tag(tag):
+        response = session.get(
+            f"{QB_URL}/api/v2/torrents/info", params={"tag": tag}, verify=False
+        )
+        return {torrent["hash"] for torrent in response.json()}
 
-    if not tags_to_delete:
-        return
+    with ThreadPoolExecutor(max_workers=max(1, len(tags))) as pool:
+        return dict(zip(tags, pool.map(fetch_tag, tags)))
 
-    delete_response = requests.post(
-        f"{QB_URL}/api/v2/torrents/deleteTags",
-        data={"tags": ",".join(tags_to_delete)},
-        auth=(QB_USERNAME, QB_PASSWORD),
-        verify=True,
-        timeout=10.0,
-    )
 
-    if delete_response.status_code != 200:
-        print(f"Failed to delete tags: {tags_to_delete}.")
+def diff_tags(desired_by_tag, current_by_tag):
+    """
+    Compares the hashes that should carry each tag with the ones that do and
+    returns the (to_add, to_remove) hashes per tag. Tags without changes are
+    left out, so nothing is sent for them.
+    """
+    to_add = {}
+    to_remove = {}
+    for tag, desired in desired_by_tag.items():
+        current = current_by_tag.get(tag, set())
+        if desired - current:
+            to_add[tag] = sorted(desired - current)
+        if current - desired:
+            to_remove[tag] = sorted(current - desired)
+    return to_add, to_remove
+
+
+def send_tag_changes(session, action, hashes_by_tag, batch_size=TAG_BATCH_SIZE):
+    """
+    Sends one torrents/addTags or torrents/removeTags request per tag and batch
+    of hashes, instead of one per torrent. Returns the number of requests sent
+    and the hashes of every batch that failed, by tag.
+    """
+    requests_sent = 0
+    failed_by_tag = {}
+    for tag, hashes in hashes_by_tag.items():
+        for start in range(0, len(hashes), batch_size):
+            batch = hashes[start : start + batch_size]
+            response = session.post(
+                f"{QB_URL}/api/v2/torrents/{action}",
+                data={"hashes": "|".join(batch), "tags": tag},
+            )
+            requests_sent += 1
+            if response.status_code != 200:
+                print(f"Failed to {action} '{tag}' for {len(batch)} torrents.")
+                failed_by_tag.setdefault(tag, set()).update(batch)
+    return requests_sent, failed_by_tag
+
+
+def login(session):
+    return session.post(
+        f"{QB_URL}/api/v2/auth/login",
+        data={"username": QB_USERNAME, "password": QB_PASSWORD},
+    )
 
 
 # Convert the categories string into a list
 CATEGORIES_LIST = [category.strip() for category in CATEGORIES.split(",")]
 
 
+def fetch_category(session, category):
+    """
+    Returns the noHL torrents of one category. qBittorrent filters by tag and
+    category itself, so only those torrents are sent, and only TORRENT_FIELDS
+    of each are kept.
+    """
+    response = session.get(
+        f"{QB_URL}/api/v2/torrents/info",
+        params={"tag": NOHL_TAG, "category": category},
+        verify=False,
+    )
+    return [
+        {field: torrent[field] for field in TORRENT_FIELDS}
+        for torrent in response.json()
+    ]
+
+
+def fetch_nohl_torrents(session):
+    """Fetches the noHL torrents of all CATEGORIES_LIST at the same time."""
+    with ThreadPoolExecutor(max_workers=len(CATEGORIES_LIST)) as pool:
+        torrent_lists = list(
+            pool.map(
+                lambda category: fetch_category(session, category), CATEGORIES_LIST
+            )
+        )
+    # A category listed twice must not tag its torrents twice
+    return list(
+        {
+            torrent["hash"]: torrent
+            for torrents in torrent_lists
+            for torrent in torrents
+        }.values()
+    )
+
+
+class LiveTagger:
+    """
+    Follows /api/v2/sync/maindata and keeps every torrent's name, tags, category
+    and classes in memory. Only torrents whose name, tags or category changed
+    since the last rid are looked at again, and the tag changes they need are
+    collected until flush() sends them in batches.
+    """
+
+    FIELDS = ("name", "tags", "category")
+
+    def __init__(self, managed, classifier=classify):
+        self.managed = managed
+        self.classify = classifier
+        self.rid = 0
+        self.reset()
+
+    def reset(self):
+        self.torrents = {}
+        self.classes = {}  # Classes of each name, only recomputed when the name changes
+        self.to_add = {tag: set() for _, tag in self.managed}
+        self.to_remove = {tag: set() for _, tag in self.managed}
+
+    def apply(self, maindata):
+        if maindata.get("full_update"):
+            self.reset()
+
+        for torrent_hash, changes in (maindata.get("torrents") or {}).items():
+            if not any(field in changes for field in self.FIELDS):
+                continue  # Only stats changed
+            torrent = self.torrents.setdefault(
+                torrent_hash, {"name": "", "tags": "", "category": ""}
+            )
+            if changes.get("name", torrent["name"]) != torrent["name"]:
+                self.classes.pop(torrent_hash, None)
+            for field in self.FIELDS:
+                if field in changes:
+                    torrent[field] = changes[field]
+            self.reconcile(torrent_hash)
+
+        for torrent_hash in maindata.get("torrents_removed") or []:
+            self.torrents.pop(torrent_hash, None)
+            self.classes.pop(torrent_hash, None)
+            for pending in (self.to_add, self.to_remove):
+                for hashes in pending.values():
+                    hashes.discard(torrent_hash)
+
+        self.rid = maindata["rid"]
+
+    def reconcile(self, torrent_hash):
+        torrent = self.torrents[torrent_hash]
+        tags = {tag.strip() for tag in torrent["tags"].split(",")}
+
+        classes = ()
+        if NOHL_TAG in tags and torrent["category"] in CATEGORIES_LIST:
+            classes = self.classes.get(torrent_hash)
+            if classes is None:
+                classes = self.classes[torrent_hash] = self.classify(torrent["name"])
+
+        for torrent_class, tag in self.managed:
+            wanted = torrent_class in classes
+            if wanted and tag not in tags:
+                self.to_add[tag].add(torrent_hash)
+                self.to_remove[tag].discard(torrent_hash)
+            elif tag in tags and not wanted:
+                self.to_remove[tag].add(torrent_hash)
+                self.to_add[tag].discard(torrent_hash)
+            else:
+                self.to_add[tag].discard(torrent_hash)
+                self.to_remove[tag].discard(torrent_hash)
+
+    def flush(self, session):
+        """
+        Sends the collected tag changes and returns (added, removed, requests sent).
+        Changes of a failed batch stay pending and are sent again on the next flush.
+        """
+        changed = []
+        requests_sent = 0
+        for action, pending, update in (
+            ("addTags", self.to_add, set.add),
+            ("removeTags", self.to_remove, set.discard),
+        ):
+            hashes_by_tag = {
+                tag: sorted(hashes) for tag, hashes in pending.items() if hashes
+            }
+            sent, failed_by_tag = send_tag_changes(session, action, hashes_by_tag)
+            requests_sent += sent
+
+            # Apply what was sent locally, so its echo in the next delta changes nothing
+            count = 0
+            for tag, hashes in hashes_by_tag.items():
+                failed = failed_by_tag.get(tag, ())
+                for torrent_hash in hashes:
+                    if torrent_hash in failed:
+                        continue
+                    torrent = self.torrents[torrent_hash]
+                    tags = {name.strip() for name in torrent["tags"].split(",")} - {""}
+                    update(tags, tag)
+                    torrent["tags"] = ", ".join(sorted(tags))
+                    pending[tag].discard(torrent_hash)
+                    count += 1
+            changed.append(count)
+
+        return changed[0], changed[1], requests_sent
+
+
+def run_daemon(session, args, managed, classifier):
+    tagger = LiveTagger(managed, classifier)
+    last_flush = 0.0
+    print(
+        f"Following qBittorrent every {args.daemon} seconds, "
+        f"updating tags every {args.flush_interval} seconds"
+    )
+
+    logged_in = True
+    try:
+        while True:
+            try:
+                if not logged_in:
+                    login(session).raise_for_status()
+                    logged_in = True
+
+                response = session.get(
+                    f"{QB_URL}/api/v2/sync/maindata",
+                    params={"rid": tagger.rid},
+                    verify=False,
+                )
+                response.raise_for_status()
+                tagger.apply(response.json())
+
+                if time.monotonic() - last_flush >= args.flush_interval:
+                    added, removed, requests_sent = tagger.flush(session)
+                    last_flush = time.monotonic()
+                    if requests_sent:
+                        print(
+                            f"{datetime.now():%Y-%m-%d %H:%M:%S}: added {added} and "
+                            f"removed {removed} tag(s) with {requests_sent} request(s)"
+                        )
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # qBittorrent may have restarted, log in again and start over
+                print(f"Error following qBittorrent: {e}")
+                tagger.rid = 0
+                logged_in = False
+
+            time.sleep(args.daemon)
+    except KeyboardInterrupt:
+        tagger.flush(session)  # Don't lose the changes collected since the last flush
+
+
 def has_noHL_tag(tags: str) -> bool:
     return NOHL_TAG in tags.split(",")
 
@@ -85,150 +625,130 @@ def has_nohl_episodes_or_seasons(tags: str) -> bool:
     return NOHL_EPISODES_TAG in tags_list or NOHL_SEASONS_TAG in tags_list
 
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(
-    description="Script to manage noHL-tagged torrents in qBittorent, classifying them accordingly."
-)
-parser.add_argument(
-    "--seasons",
-    action="store_true",
-    help="Search for season packs matching the regex pattern.",
-)
-parser.add_argument(
-    "--episodes",
-    action="store_true",
-    help="Search for episodes matching the regex pattern.",
-)
-parser.add_argument(
-    "--unmatched",
-    action="store_true",
-    help="Tag torrents that do not match the season or episode patterns.",
-)
-parser.add_argument(
-    "--all",
-    action="store_true",
-    help="Run all actions together",
-)
-args = parser.parse_args()
-
-if not (args.seasons or args.episodes or args.unmatched or args.all):
-    parser.print_help()
-    exit()
-
-if args.all:
-    args.seasons = args.episodes = args.unmatched = True
-
-# Set the regex pattern and the tag based on the command line arguments
-if args.seasons:
-    regex_pattern = SEASONS_REGEX_PATTERN
-    tag = NOHL_SEASONS_TAG
-elif args.episodes:
-    regex_pattern = EPISODES_REGEX_PATTERN
-    tag = NOHL_EPISODES_TAG
-elif args.unmatched:
-    regex_pattern = UNMATCHED_REGEX_PATTERN
-    tag = NOHL_UNMATCHED_TAG
-else:
-    parser.print_help()
-    exit()
-
-session = requests.Session()  # Authenticate with qBittorrent Web UI
-auth_response = session.post(
-    f"{QB_URL}/api/v2/auth/login",
-    data={"username": QB_USERNAME, "password": QB_PASSWORD},
-)
-
-print("Script version 1.1")
-print(f"Auth status code: {auth_response.status_code}")
-print(f"Auth response text: {auth_response.text}")
-print("Please wait...")
-
-delete_tags()
-time.sleep(2)  # wait for tags to be deleted
-
-# Get the list of torrents
-response = session.get(f"{QB_URL}/api/v2/torrents/info", verify=False)
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Script to manage noHL-tagged torrents in qBittorent, classifying them accordingly."
+    )
+    parser.add_argument(
+        "--seasons",
+        action="store_true",
+        help="Search for season packs matching the regex pattern.",
+    )
+    parser.add_argument(
+        "--episodes",
+        action="store_true",
+        help="Search for episodes matching the regex pattern.",
+    )
+    parser.add_argument(
+        "--unmatched",
+        action="store_true",
+        help="Tag torrents that do not match the season or episode patterns.",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Run all actions together",
+    )
+    parser.add_argument(
+        "--rules",
+        type=str,
+        default=RULES_FILE,
+        metavar="FILE",
+        help="Tag torrents with the patterns and tags of a TOML or JSON rules file instead of --seasons/--episodes/--unmatched.",
+    )
+    parser.add_argument(
+        "--daemon",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="SECONDS",
+        help="Keep running and follow the changes in qBittorrent every SECONDS (default: 10).",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=int,
+        default=FLUSH_INTERVAL,
+        metavar="SECONDS",
+        help=f"In --daemon mode, send the collected tag changes every SECONDS (default: {FLUSH_INTERVAL}).",
+    )
+    args = parser.parse_args()
 
-try:
-    torrents = response.json()
-except requests.exceptions.JSONDecodeError:
-    print("Failed to decode JSON.")
-    torrents = []
-
-nohl_seasons_count = 0
-nohl_episodes_count = 0
-nohl_unmatched_count = 0
-
-# Process the torrents
-total_torrents = len(torrents)
-progress_interval = 20  # Print progress every 20 torrents
-for index, torrent in enumerate(
-    torrents, 1
-):  # Start index from 1 for user-friendly output
-    torrent_name = torrent["name"]
-
-    # Print iteration progress without creating a new line
-    if index % progress_interval == 0 or index == total_torrents:
-        print(f"Processing torrent {index}/{total_torrents}\r", end="")
-
-    # Check if the torrent has the "noHL" tag and belongs to one of the specified categories
-    if NOHL_TAG in torrent["tags"] and any(
-        category in torrent["category"] for category in CATEGORIES_LIST
+    if not (
+        args.seasons or args.episodes or args.unmatched or args.all or args.rules
     ):
-        tags = torrent["tags"]
-        tags_list = tags.split(",")
+        parser.print_help()
+        exit()
 
-        updated_tags_list = tags_list.copy()
+    if args.all:
+        args.seasons = args.episodes = args.unmatched = True
+
+    return args
+
+
+def main():
+    args = parse_arguments()
+    managed, classifier = load_classifier(args)
+
+    session = requests.Session()  # Authenticate with qBittorrent Web UI
+    auth_response = login(session)
+
+    print("Script version 1.2")
+    print(f"Auth status code: {auth_response.status_code}")
+    print(f"Auth response text: {auth_response.text}")
+    print("Please wait...")
+
+    if args.daemon:
+        run_daemon(session, args, managed, classifier)
+        return
+
+    # Get the noHL torrents of the configured categories and who has which tag now
+    try:
+        torrents = fetch_nohl_torrents(session)
+        current_by_tag = fetch_tagged_hashes(session, [tag for _, tag in managed])
+    except requests.exceptions.JSONDecodeError:
+        print("Failed to decode JSON.")
+        return
+
+    desired_by_tag = {tag: set() for _, tag in managed}
+
+    # Process the torrents
+    total_torrents = len(torrents)
+    progress_interval = 20  # Print progress every 20 torrents
+    for index, torrent in enumerate(
+        torrents, 1
+    ):  # Start index from 1 for user-friendly output
+        torrent_name = torrent["name"]
+
+        # Print iteration progress without creating a new line
+        if index % progress_interval == 0 or index == total_torrents:
+            print(f"Processing torrent {index}/{total_torrents}\r", end="")
+
+        classes = classifier(torrent_name)
+        for torrent_class, tag in managed:
+            if torrent_class in classes:
+                desired_by_tag[tag].add(torrent["hash"])
+
+    # Only the differences are written: tags that are missing are added, and tags
+    # on torrents that are no longer noHL or changed class are removed
+    to_add, to_remove = diff_tags(desired_by_tag, current_by_tag)
+    requests_sent, _ = send_tag_changes(session, "addTags", to_add)
+    removes_sent, _ = send_tag_changes(session, "removeTags", to_remove)
+    requests_sent += removes_sent
+
+    # Print the summary at the end
+    print(f"Total noHL torrents processed: {total_torrents}")
+
+    for _, tag in managed:
+        print(
+            f"Tagged {len(to_add.get(tag, []))} torrents with '{tag}', "
+            f"removed it from {len(to_remove.get(tag, []))}"
+        )
+    changes = sum(map(len, to_add.values())) + sum(map(len, to_remove.values()))
+    print(
+        f"Sent {requests_sent} write request(s) for {changes} tag change(s), "
+        f"saved {changes - requests_sent}"
+    )
 
-        # Check for seasons and update tags if not present
-        if (
-            args.seasons
-            and re.match(SEASONS_REGEX_PATTERN, torrent_name)
-            and NOHL_SEASONS_TAG not in tags_list
-        ):
-            updated_tags_list.append(NOHL_SEASONS_TAG)
-            nohl_seasons_count += 1
-
-        # Check for episodes and update tags if not present
-        if (
-            args.episodes
-            and re.match(EPISODES_REGEX_PATTERN, torrent_name)
-            and NOHL_EPISODES_TAG not in tags_list
-        ):
-            updated_tags_list.append(NOHL_EPISODES_TAG)
-            nohl_episodes_count += 1
-
-        # Check for unmatched and update tags if not present
-        if (
-            args.unmatched
-            and not (
-                re.match(SEASONS_REGEX_PATTERN, torrent_name)
-                or re.match(EPISODES_REGEX_PATTERN, torrent_name)
-            )
-            and NOHL_UNMATCHED_TAG not in tags_list
-        ):
-            updated_tags_list.append(NOHL_UNMATCHED_TAG)
-            nohl_unmatched_count += 1
-
-        # Update tags if there are any changes
-        if updated_tags_list != tags_list:
-            session.post(
-                f"{QB_URL}/api/v2/torrents/addTags",
-                data={
-                    "hashes": torrent["hash"],
-                    "tags": ",".join(updated_tags_list),
-                },
-            )
 
-# Print the summary at the end
-total_processed = (
-    nohl_seasons_count + nohl_episodes_count + nohl_unmatched_count
-)
-print(f"Total torrents processed: {total_processed} out of {total_torrents}")
-
-if args.seasons:
-    print(f"Tagged {nohl_seasons_count} torrents with '{NOHL_SEASONS_TAG}'")
-if args.episodes:
-    print(f"Tagged {nohl_episodes_count} torrents with '{NOHL_EPISODES_TAG}'")
-if args.unmatched:
-    print(f"Tagged {nohl_unmatched_count} torrents with '{NOHL_UNMATCHED_TAG}'")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Author: soup
+Description: Helpers shared by the Radarr scripts. Keep this file next to the scripts that import it.
+"""
+
+import codecs
+import heapq
+import json
+import random
+import sqlite3
+import time
+from datetime import date
+
+
+def iter_json_array(response, chunk_size=1 << 16):
+    """
+    Yields the elements of a JSON array response one at a time, so a large
+    library never has to be held in memory as a whole.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = finished = False
+
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        buffer += text_decoder.decode(chunk)
+        position = 0
+
+        while not finished:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                finished = True
+                break
+            try:
+                element, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # The element continues in the next chunk
+            yield element
+
+        buffer = buffer[position:]
+
+    if not finished:
+        raise ValueError("Incomplete JSON array")
+
+
+def parse_release_date(value):
+    """
+    Turns a Radarr release date like "2023-05-17T00:00:00Z" into 20230517.
+    The format is fixed, so slicing is enough and much cheaper than strptime.
+    """
+    if value is None:
+        return None
+    return int(value[0:4] + value[5:7] + value[8:10])
+
+
+def earliest_release_date(movie):
+    release_dates = [
+        release_date
+        for release_date in (
+            parse_release_date(movie.get("physicalRelease")),
+            parse_release_date(movie.get("digitalRelease")),
+        )
+        if release_date is not None
+    ]
+    return min(release_dates) if release_dates else None
+
+
+def today_release_date():
+    today = date.today()
+    return today.year * 10000 + today.month * 100 + today.day
+
+
+class SearchScheduler:
+    """
+    Remembers when each movie was last searched so every run searches the movies
+    that have waited the longest, and caps the number of searches per day.
+    """
+
+    def __init__(self, path, queue, daily_budget=None, cooldown_hours=0):
+        self.connection = sqlite3.connect(path)
+        self.queue = queue
+        self.daily_budget = daily_budget
+        self.cooldown = cooldown_hours * 3600
+
+        with self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS searches (
+                    queue TEXT, movie_id INTEGER, last_searched REAL,
+                    PRIMARY KEY (queue, movie_id))"""
+            )
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS budget (
+                    queue TEXT, day TEXT, used INTEGER,
+                    PRIMARY KEY (queue, day))"""
+            )
+
+    def remaining_budget(self):
+        if self.daily_budget is None:
+            return None
+        row = self.connection.execute(
+            "SELECT used FROM budget WHERE queue = ? AND day = ?",
+            (self.queue, date.today().isoformat()),
+        ).fetchone()
+        return max(0, self.daily_budget - (row[0] if row else 0))
+
+    def pick(self, movies, count):
+        """
+        Returns up to count movies, least recently searched first. Movies that were
+        never searched come first, in random order.
+        """
+        remaining = self.remaining_budget()
+        if remaining is not None:
+            count = min(count, remaining)
+
+        last_searched = dict(
+            self.connection.execute(
+                "SELECT movie_id, last_searched FROM searches WHERE queue = ?",
+                (self.queue,),
+            )
+        )
+        cutoff = time.time() - self.cooldown
+
+        heap = []
+        for index, movie in enumerate(movies):
+            searched_at = last_searched.get(movie.id, 0)
+            if searched_at <= cutoff:
+                heap.append((searched_at, random.random(), index, movie))
+        heapq.heapify(heap)
+
+        return [heapq.heappop(heap)[3] for _ in range(min(count, len(heap)))]
+
+    def record(self, movies):
+        now = time.time()
+        today = date.today().isoformat()
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?)",
+                [(self.queue, movie.id, now) for movie in movies],
+            )
+            self.connection.execute(
+                "DELETE FROM budget WHERE queue = ? AND day < ?", (self.queue, today)
+            )
+            self.connection.execute(
+                "INSERT OR IGNORE INTO budget VALUES (?, ?, 0)", (self.queue, today)
+            )
+            self.connection.execute(
+                "UPDATE budget SET used = used + ? WHERE queue = ? AND day = ?",
+                (len(movies), self.queue, today),
+            )